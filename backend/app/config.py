@@ -22,9 +22,38 @@ class Config():
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", 0.7))
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", 2000))
 
+    # LLM gateway settings
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "groq")  # "groq" or "fake"
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    LLM_MAX_QUEUE_SIZE: int = int(os.getenv("LLM_MAX_QUEUE_SIZE", 32))
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", 30))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 3))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", 8))
+    LLM_RETRY_AFTER_SECONDS: int = int(os.getenv("LLM_RETRY_AFTER_SECONDS", 5))
+    FAKE_LLM_LATENCY: float = float(os.getenv("FAKE_LLM_LATENCY", 0.2))
+    FAKE_LLM_ERROR_RATE: float = float(os.getenv("FAKE_LLM_ERROR_RATE", 0.0))
+
+    # Context gathering settings (per-branch timeouts in seconds)
+    CONTEXT_PATIENT_TIMEOUT: float = float(os.getenv("CONTEXT_PATIENT_TIMEOUT", 1.0))
+    CONTEXT_DIGEST_TIMEOUT: float = float(os.getenv("CONTEXT_DIGEST_TIMEOUT", 1.0))
+    CONTEXT_RETRIEVAL_TIMEOUT: float = float(os.getenv("CONTEXT_RETRIEVAL_TIMEOUT", 3.0))
+    CONTEXT_MAX_WORKERS: int = int(os.getenv("CONTEXT_MAX_WORKERS", 16))
+    CONTEXT_RETRIEVAL_TOP_K: int = int(os.getenv("CONTEXT_RETRIEVAL_TOP_K", 5))
+
+    # Chart digest settings
+    DIGEST_LATEST_NOTES: int = int(os.getenv("DIGEST_LATEST_NOTES", 10))
+
+    # Note search settings
+    SEARCH_RRF_K: int = int(os.getenv("SEARCH_RRF_K", 60))
+    SEARCH_CANDIDATES: int = int(os.getenv("SEARCH_CANDIDATES", 50))
+
     # Vector Database settings
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "medical-chatbot")
+    # Shared namespace holding every patient's notes for cohort search
+    COHORT_NAMESPACE: str = os.getenv("COHORT_NAMESPACE", "cohort")
+    COHORT_OVERFETCH: int = int(os.getenv("COHORT_OVERFETCH", 5))
 
     # Database settings
     DATABASE_URI: str = os.getenv("DATABASE_URI")
@@ -47,6 +76,7 @@ class Config():
         """Initialize the configuration settings."""
         self._setup_logging()
         self._ensure_upload_folder()
+        self._validate_settings()
 
     def _setup_logging(self):
         """Configure logging based on settings"""
@@ -59,6 +89,11 @@ class Config():
             ]
         )
 
+    def _validate_settings(self):
+        """Reject settings that would break invariants elsewhere"""
+        if self.DIGEST_LATEST_NOTES < 1:
+            raise ValueError("DIGEST_LATEST_NOTES must be at least 1")
+
     def _ensure_upload_folder(self):
         """Ensure upload folder exists with proper permissions"""
         if not os.path.exists(self.UPLOAD_FOLDER):
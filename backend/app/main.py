@@ -2,12 +2,13 @@
 from datetime import datetime, date
 from typing import List, Optional
 import uuid
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import UUID4, BaseModel
+from pydantic import UUID4, BaseModel, Field
 from routes import chatbot, auth
 from services.chat_service import HealthCareAgent
-from services.patient_service import PatientService
+from services.llm_gateway import LLMOverloadedError, LLMTimeoutError, LLMUnavailableError
+from services.patient_service import MAX_COHORT_LIMIT, PatientService
 
 app = FastAPI(title="Medical AI Chatbot API")
 
@@ -45,6 +46,8 @@ class MedicalRecordCreate(BaseModel):
     patient_id: int
     note: str
     provider_id: int
+    condition: Optional[str] = None
+    treatment: Optional[str] = None
 
 class MedicalRecordResponse(BaseModel):
     record_id: UUID4
@@ -53,6 +56,34 @@ class MedicalRecordResponse(BaseModel):
     vector_id: str
     created_at: datetime
     created_by: int
+    condition: Optional[str] = None
+    treatment: Optional[str] = None
+
+class NoteSearchResult(BaseModel):
+    record_id: UUID4
+    patient_id: int
+    note: str
+    vector_id: UUID4
+    created_at: datetime
+    created_by: int
+    score: float
+
+class CohortSearchRequest(BaseModel):
+    query: str
+    condition: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    exclude_patient_id: Optional[int] = None
+    limit: int = Field(10, ge=1, le=MAX_COHORT_LIMIT)
+
+class CohortSearchResult(BaseModel):
+    patient_id: int
+    record_id: Optional[UUID4] = None
+    vector_id: str
+    note: str
+    condition: Optional[str] = None
+    created_at: datetime
+    score: float
 
 class ChatMessage(BaseModel):
     message: str
@@ -105,7 +136,9 @@ async def add_medical_record(record: MedicalRecordCreate):
         new_record = patient_service.add_medical_record(
             patient_id=record.patient_id,
             note=record.note,
-            provider_id=record.provider_id
+            provider_id=record.provider_id,
+            condition=record.condition,
+            treatment=record.treatment
         )
         return new_record
     except ValueError as e:
@@ -135,9 +168,9 @@ async def get_patient_history(patient_id: int):
         # Verify patient exists
         await verify_patient(patient_id)
         
-        # Get history
-        history = patient_service.get_patient_history(patient_id)
-        history = patient_service.format_get_patient_history(history)
+        # Get history from the materialized chart digest
+        digest = patient_service.get_patient_digest(patient_id)
+        history = patient_service.format_patient_digest(digest)
 
         return history
     except ValueError as e:
@@ -145,6 +178,56 @@ async def get_patient_history(patient_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+# Plain def: FastAPI runs it in its threadpool, keeping the BERT encode,
+# Pinecone round trip and Postgres queries off the event loop
+@app.get("/api/patients/{patient_id}/notes/search", response_model=List[NoteSearchResult])
+def search_patient_notes(
+    patient_id: int,
+    q: str,
+    mode: str = "keyword",
+    limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Search a patient's notes. Modes: keyword (full-text), semantic (vector) or hybrid (RRF).
+    """
+    try:
+        # Verify patient exists
+        if not patient_service.get_patient(patient_id):
+            raise HTTPException(status_code=404, detail="Patient not found")
+
+        return patient_service.search_medical_records(
+            patient_id=patient_id,
+            query=q,
+            mode=mode,
+            limit=limit
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Plain def so the query encode and Pinecone call run in FastAPI's threadpool
+@app.post("/api/cohort/similar", response_model=List[CohortSearchResult])
+def search_similar_patients(search: CohortSearchRequest):
+    """
+    Find patients with notes similar to the query, one hit per patient.
+    """
+    try:
+        return patient_service.find_similar_patients(
+            query=search.query,
+            condition=search.condition,
+            start_date=search.start_date,
+            end_date=search.end_date,
+            exclude_patient_id=search.exclude_patient_id,
+            limit=search.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(chat_message: ChatMessage):
     """
@@ -154,19 +237,28 @@ async def chat(chat_message: ChatMessage):
         # Verify patient exists
         await verify_patient(chat_message.patient_id)
         
-        response = health_agent.process_message(
+        # Start a new thread if none was provided; the same ID keys the stored
+        # history, so the client's next turn sees this one
+        thread_id = chat_message.thread_id or str(uuid.uuid4())
+
+        response = await health_agent.process_message(
             input_text=chat_message.message,
             patient_id=chat_message.patient_id,
-            thread_id=chat_message.thread_id if chat_message.thread_id else None
+            thread_id=thread_id
         )
         
-        # If no thread_id was provided, get it from the agent's state
-        thread_id = chat_message.thread_id or str(uuid.uuid4())
-        
         return ChatResponse(
             message=response,
             thread_id=thread_id
         )
+    except (LLMOverloadedError, LLMUnavailableError) as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -185,6 +277,20 @@ async def get_chat_history(thread_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """
+    Get LLM gateway queue depth, wait times and outcome counters.
+    """
+    return health_agent.gateway.stats()
+
+@app.get("/api/context/stats")
+async def get_context_stats():
+    """
+    Get context-gathering pool usage, saturation and timeout counters.
+    """
+    return health_agent.context_stats()
+
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
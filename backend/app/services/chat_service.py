@@ -1,28 +1,64 @@
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, List, Optional
+import asyncio
+import logging
+import operator
+import threading
 import uuid
 from langchain_groq import ChatGroq
 from langgraph.graph import MessagesState, StateGraph, START
 from langchain_core.messages import HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from config import config
+from services.fake_llm import FakeLLM
+from services.llm_gateway import LLMGateway
 from services.patient_service import PatientService
 
 class State(MessagesState):
     patient_id: Optional[int] = None
     patient_history: Optional[str] = None
     thread_id: Optional[str] = None
+    patient_info: Optional[str] = None
+    relevant_notes: Optional[str] = None
+    prior_messages: Optional[list] = None
+    # Branches that timed out or failed and fell back to a placeholder
+    context_errors: Annotated[List[str], operator.add] = []
 
 class HealthCareAgent:
     def __init__(self):
-        self.llm = ChatGroq(model="llama-3.3-70b-versatile")
+        self.logger = logging.getLogger(__name__)
+        self.llm = self._build_llm()
+        self.gateway = LLMGateway(self.llm)
         self.patient_service = PatientService()
 
+        # Dedicated pool for blocking context fetches. Timed-out fetches keep
+        # their worker until they return, so track busy workers to spot saturation.
+        self.context_executor = ThreadPoolExecutor(
+            max_workers=config.CONTEXT_MAX_WORKERS, thread_name_prefix="context"
+        )
+        self._context_lock = threading.Lock()
+        self._context_busy = 0
+        self._context_saturated = 0
+        self._context_timeouts = 0
+        self._context_failures = 0
+
         # Initialize conversation states (replacing checkpointer)
         self.conversation_states = {}
         
         # Build graph
         self.graph = self._build_graph()
 
-    def call_model(self, state: State):
+    def _build_llm(self):
+        """Build the underlying model; retries and timeouts are owned by the gateway"""
+        if config.LLM_BACKEND == "fake":
+            return FakeLLM()
+        return ChatGroq(
+            model="llama-3.3-70b-versatile",
+            max_retries=0,
+            timeout=config.LLM_REQUEST_TIMEOUT,
+        )
+
+    async def call_model(self, state: State):
         """Call the model with the given state."""
         prompt_template = ChatPromptTemplate.from_messages([
             ("system", """
@@ -30,7 +66,9 @@ class HealthCareAgent:
             and accurately. Always maintain patient confidentiality.
             
             Current Patient ID: {patient_id}
-            Patient History: {patient_history}
+            Patient Details: {patient_info}
+            Patient Chart: {patient_history}
+            Notes Relevant To This Question: {relevant_notes}
             
             Guidelines:
             - Maintain HIPAA compliance
@@ -40,25 +78,137 @@ class HealthCareAgent:
             MessagesPlaceholder(variable_name="messages"),
         ])
 
-        messages = state.get("messages", [])
+        messages = (state.get("prior_messages") or []) + state.get("messages", [])
         patient_id = state.get("patient_id", "")
         patient_history = state.get("patient_history", "")
+        patient_info = state.get("patient_info", "")
+        relevant_notes = state.get("relevant_notes", "")
 
-        prompt = prompt_template.invoke({"messages": messages, "patient_id": patient_id, "patient_history": patient_history})
+        if state.get("context_errors"):
+            self.logger.warning(f"Calling model with partial context, missing: {state['context_errors']}")
 
-        response = self.llm.invoke(prompt)
+        prompt = prompt_template.invoke({
+            "messages": messages,
+            "patient_id": patient_id,
+            "patient_history": patient_history,
+            "patient_info": patient_info,
+            "relevant_notes": relevant_notes,
+        })
+
+        response = await self.gateway.ainvoke(prompt)
 
         return {"messages": response}
 
+    async def _run_branch(self, name: str, fn, timeout: float, fallback):
+        """Run a blocking context fetch on the context pool, falling back on timeout or error"""
+        with self._context_lock:
+            if self._context_busy >= config.CONTEXT_MAX_WORKERS:
+                self._context_saturated += 1
+                self.logger.warning(
+                    f"Context pool saturated ({self._context_busy} busy), branch '{name}' will queue"
+                )
+            self._context_busy += 1
+
+        future = self.context_executor.submit(fn)
+        future.add_done_callback(self._release_context_worker)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout), []
+        except asyncio.TimeoutError:
+            self._context_timeouts += 1
+            self.logger.warning(f"Context branch '{name}' timed out after {timeout}s")
+        except Exception as e:
+            self._context_failures += 1
+            self.logger.error(f"Context branch '{name}' failed: {str(e)}")
+        return fallback, [name]
+
+    def _release_context_worker(self, _future) -> None:
+        """Mark a context worker free once its fetch has actually finished"""
+        with self._context_lock:
+            self._context_busy -= 1
+
+    def context_stats(self):
+        """Return context pool usage and branch outcome counters"""
+        return {
+            "max_workers": config.CONTEXT_MAX_WORKERS,
+            "busy_workers": self._context_busy,
+            "saturated": self._context_saturated,
+            "timed_out": self._context_timeouts,
+            "failed": self._context_failures,
+        }
+
+    async def fetch_patient_info(self, state: State):
+        """Fetch patient demographics."""
+        def fetch():
+            patient = self.patient_service.get_patient(state["patient_id"])
+            if not patient:
+                return "Unavailable"
+            return (
+                f"Name: {patient['name']}, "
+                f"Date of Birth: {patient['date_of_birth']}, "
+                f"Gender: {patient['gender']}"
+            )
+
+        patient_info, errors = await self._run_branch(
+            "patient_info", fetch, config.CONTEXT_PATIENT_TIMEOUT, "Unavailable"
+        )
+        return {"patient_info": patient_info, "context_errors": errors}
+
+    async def fetch_chart_digest(self, state: State):
+        """Fetch the patient's chart digest from Postgres."""
+        def fetch():
+            digest = self.patient_service.get_patient_digest(state["patient_id"])
+            return self.patient_service.format_patient_digest(digest)
+
+        patient_history, errors = await self._run_branch(
+            "chart_digest", fetch, config.CONTEXT_DIGEST_TIMEOUT, "Unavailable"
+        )
+        return {"patient_history": patient_history, "context_errors": errors}
+
+    async def fetch_relevant_notes(self, state: State):
+        """Retrieve notes semantically similar to the latest message."""
+        query_text = state["messages"][-1].content
+
+        def fetch():
+            results = self.patient_service.pine.query_vectors(
+                state["patient_id"], query_text, top_k=config.CONTEXT_RETRIEVAL_TOP_K
+            )
+            notes = [
+                f"Note: {match.metadata.get('note', '')} (score: {match.score:.2f})"
+                for match in results.matches
+            ]
+            return "\n---\n".join(notes)
+
+        relevant_notes, errors = await self._run_branch(
+            "relevant_notes", fetch, config.CONTEXT_RETRIEVAL_TIMEOUT, "Unavailable"
+        )
+        return {"relevant_notes": relevant_notes, "context_errors": errors}
+
+    async def fetch_prior_messages(self, state: State):
+        """Load earlier messages from the same conversation thread."""
+        # In-memory lookup: cheap enough to run inline, and it must never fall back
+        previous = self.conversation_states.get(state["thread_id"], {})
+        return {"prior_messages": list(previous.get("messages", []))}
+
     def _build_graph(self):
         workflow = StateGraph(state_schema=State)
 
+        # Independent context fetches fan out from START and join before the model
+        branches = {
+            "patient_info": self.fetch_patient_info,
+            "chart_digest": self.fetch_chart_digest,
+            "relevant_notes": self.fetch_relevant_notes,
+            "prior_messages": self.fetch_prior_messages,
+        }
+        for name, node in branches.items():
+            workflow.add_node(name, node)
+            workflow.add_edge(START, name)
+
         workflow.add_node("model", self.call_model)
-        workflow.add_edge(START, "model")
+        workflow.add_edge(list(branches), "model")
 
         return workflow.compile()
     
-    def process_message(
+    async def process_message(
             self,
             input_text: str,
             patient_id: int,
@@ -73,26 +223,28 @@ class HealthCareAgent:
         # Create or use thread ID
         thread_id = thread_id or str(uuid.uuid4())
 
-        history = self.patient_service.get_patient_history(patient_id)
-        patient_history = self.patient_service.format_get_patient_history(history)
-
-        # Initialize state
+        # Initialize state; patient context is gathered by the graph branches
         initial_state = State(
             thread_id=thread_id,
             patient_id=patient_id,
-            patient_history=patient_history,
-            messages=[]
+            messages=[],
+            context_errors=[]
         )
 
         # Add input message as HumanMessage object
         input_message = HumanMessage(content=input_text)
         initial_state["messages"].append(input_message)
 
-        # Store state in conversation states
-        self.conversation_states[thread_id] = initial_state
-
         # Process through graph
-        result = self.graph.invoke(initial_state)
+        result = await self.graph.ainvoke(initial_state)
+
+        # Append this turn to the stored thread rather than rebuilding it
+        stored = self.conversation_states.setdefault(thread_id, State(
+            thread_id=thread_id,
+            patient_id=patient_id,
+            messages=[]
+        ))
+        stored["messages"].extend(result.get("messages", []))
 
         return self._format_response(result)
     
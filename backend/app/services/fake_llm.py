@@ -0,0 +1,39 @@
+# Local stand-in for the Groq model, used to exercise the LLM gateway.
+import asyncio
+import random
+from langchain_core.messages import AIMessage
+from config import config
+
+
+class FakeLLMError(Exception):
+    """Error raised by FakeLLM carrying an HTTP-like status code."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Fake LLM error {status_code}")
+        self.status_code = status_code
+
+
+class FakeLLM:
+    def __init__(
+            self,
+            latency: float = config.FAKE_LLM_LATENCY,
+            jitter: float = 0.0,
+            error_rate: float = config.FAKE_LLM_ERROR_RATE,
+            error_status: int = 429,
+            response: str = "This is a response from the fake LLM.",
+    ):
+        """Initialize the fake LLM with injected latency and errors"""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.response = response
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        """Sleep for the configured latency, then fail or return a canned reply"""
+        self.calls += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.error_rate:
+            raise FakeLLMError(self.error_status)
+        return AIMessage(content=self.response)
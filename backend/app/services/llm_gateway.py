@@ -0,0 +1,178 @@
+# LLM gateway: concurrency limiting, deadlines and retries for model calls.
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+from config import config
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMOverloadedError(Exception):
+    """Raised when the gateway queue is full and the request is shed."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("LLM gateway is overloaded, please retry later.")
+        self.retry_after = retry_after
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the provider keeps returning 429/5xx after all retries."""
+
+    def __init__(self, status_code: int, retry_after: int):
+        super().__init__(f"LLM provider unavailable (status {status_code}), please retry later.")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a request does not complete before its deadline."""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Extract an HTTP status code from a provider error, if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[int]:
+    """Extract the upstream Retry-After header in seconds, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(1, int(float(headers.get("retry-after"))))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(
+            self,
+            llm,
+            max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+            max_queue_size: int = config.LLM_MAX_QUEUE_SIZE,
+            request_timeout: float = config.LLM_REQUEST_TIMEOUT,
+            max_retries: int = config.LLM_MAX_RETRIES,
+            retry_base_delay: float = config.LLM_RETRY_BASE_DELAY,
+            retry_max_delay: float = config.LLM_RETRY_MAX_DELAY,
+            retry_after: int = config.LLM_RETRY_AFTER_SECONDS,
+    ):
+        """Initialize the LLM gateway around any model exposing `ainvoke`"""
+        self.logger = logging.getLogger(__name__)
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_after = retry_after
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queued = 0
+        self._in_flight = 0
+
+        # Counters exposed through stats()
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._failed = 0
+        self._retries = 0
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    async def ainvoke(self, prompt, timeout: Optional[float] = None):
+        """Invoke the model, waiting for a free slot and honouring the deadline"""
+        deadline = time.monotonic() + (timeout or self.request_timeout)
+
+        # Shed load immediately instead of growing an unbounded backlog
+        if self._queued + self._in_flight >= self.max_concurrency + self.max_queue_size:
+            self._rejected += 1
+            self.logger.warning(f"LLM queue full ({self._queued} queued, {self._in_flight} in flight), rejecting request")
+            raise LLMOverloadedError(self.retry_after)
+
+        enqueued_at = time.monotonic()
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=deadline - enqueued_at)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise LLMTimeoutError("Timed out waiting for an LLM slot.")
+        finally:
+            self._queued -= 1
+
+        self._record_wait(time.monotonic() - enqueued_at)
+        self._in_flight += 1
+        try:
+            response = await self._invoke_with_retry(prompt, deadline)
+            self._completed += 1
+            return response
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    async def _invoke_with_retry(self, prompt, deadline: float):
+        """Call the model, retrying 429/5xx responses with jittered backoff"""
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._timed_out += 1
+                raise LLMTimeoutError("LLM request deadline exceeded.")
+            try:
+                return await asyncio.wait_for(self.llm.ainvoke(prompt), timeout=remaining)
+            except asyncio.TimeoutError:
+                self._timed_out += 1
+                raise LLMTimeoutError("LLM request deadline exceeded.")
+            except Exception as e:
+                status = _status_code(e)
+                if status not in RETRYABLE_STATUS_CODES:
+                    self._failed += 1
+                    self.logger.error(f"LLM call failed (status={status}): {str(e)}")
+                    raise
+                if attempt >= self.max_retries:
+                    self._failed += 1
+                    self.logger.error(f"LLM call failed after {attempt} retries (status={status}): {str(e)}")
+                    raise LLMUnavailableError(status, _retry_after(e) or self.retry_after) from e
+
+                # Full jitter keeps concurrent retries from synchronising
+                backoff = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+                delay = random.uniform(0, backoff)
+                if delay >= deadline - time.monotonic():
+                    # The provider is still failing; report that rather than a timeout
+                    self._failed += 1
+                    self.logger.error(f"LLM call failed, no time left to retry (status={status}): {str(e)}")
+                    raise LLMUnavailableError(status, _retry_after(e) or self.retry_after) from e
+
+                attempt += 1
+                self._retries += 1
+                self.logger.warning(f"LLM call returned {status}, retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _record_wait(self, wait: float) -> None:
+        """Record how long a request waited in the queue"""
+        self._admitted += 1
+        self._last_wait = wait
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, wait times and outcome counters"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "failed": self._failed,
+            "retries": self._retries,
+            "last_wait_seconds": round(self._last_wait, 4),
+            "max_wait_seconds": round(self._max_wait, 4),
+            "avg_wait_seconds": round(self._total_wait / self._admitted, 4) if self._admitted else 0.0,
+        }
@@ -1,8 +1,32 @@
+from config import config
 from services.postgres_service import PostgresService
 from services.pinecone_service import PineconeService
-from psycopg2.extras import RealDictCursor, register_uuid
+from psycopg2.extras import Json, RealDictCursor, register_uuid
+from datetime import datetime, time
 import uuid
 
+SEARCH_MODES = ("keyword", "semantic", "hybrid")
+
+# Pinecone caps top_k at 1000 when metadata is included
+MAX_COHORT_LIMIT = 1000 // config.COHORT_OVERFETCH
+
+def _adjust_counts(counts: dict, key, delta: int):
+    """Add delta to a digest counter, dropping keys that reach zero"""
+    if not key:
+        return
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+def _digest_note(record) -> dict:
+    """JSON-serializable note entry stored in a digest"""
+    return {
+        'record_id': str(record['record_id']),
+        'note': record['note'],
+        'created_by': record['created_by'],
+        'created_at': record['created_at'].isoformat(),
+    }
+
 class PatientService:
     def __init__(self):
         """Initialize Patient service"""
@@ -36,60 +60,107 @@ class PatientService:
             patient = cur.fetchone()
         return patient
 
-    def add_medical_record(self, patient_id, note: str, provider_id):
+    def add_medical_record(self, patient_id, note: str, provider_id, condition: str = None, treatment: str = None):
         """Add a medical record for a patient"""
 
         # Verify patient exists first
         if not self.get_patient(patient_id):
             raise ValueError(f"Patient {patient_id} not found")
 
+        # Fix the IDs and timestamp up front so Pinecone and Postgres agree, and
+        # index before taking the digest lock so the encode and network writes
+        # don't hold it
+        record_id = uuid.uuid4()
+        vector_id = uuid.uuid4()
+        created_at = datetime.now()
+
         # Store in Pinecone
-        vector_id = self.pine.index_patient_data(patient_id, note)
+        if not self.pine.index_patient_data(
+            patient_id,
+            note,
+            vector_id=vector_id,
+            created_at=created_at,
+            record_id=record_id,
+            condition=condition,
+        ):
+            raise RuntimeError(f"Failed to index note for patient {patient_id}")
 
-        # Store in Postgres
+        # Store in Postgres, updating the chart digest in the same transaction
         conn = self.pg.get_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                INSERT INTO medical_records (patient_id, note, vector_id, created_by)
-                VALUES (%s, %s, %s, %s)
-                RETURNING record_id, patient_id, note, vector_id, created_at, created_by
-            """, (patient_id, note, vector_id, provider_id))
-            record = cur.fetchone()
-            conn.commit()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                digest = self._lock_digest(cur, patient_id)
+
+                cur.execute("""
+                    INSERT INTO medical_records
+                        (record_id, patient_id, note, vector_id, created_by, created_at, condition, treatment)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING record_id, patient_id, note, vector_id, created_at, created_by, condition, treatment
+                """, (record_id, patient_id, note, vector_id, provider_id, created_at, condition, treatment))
+                record = cur.fetchone()
+
+                _adjust_counts(digest['conditions'], record['condition'], 1)
+                _adjust_counts(digest['treatments'], record['treatment'], 1)
+                digest['latest_notes'] = ([_digest_note(record)] + digest['latest_notes'])[:config.DIGEST_LATEST_NOTES]
+                digest['note_count'] += 1
+                self._save_digest(cur, digest)
+
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            # The row never landed, so its vectors must not stay searchable
+            self.pine.delete_vector(patient_id, vector_id)
+            raise
 
         return record
 
     def delete_medical_record(self, record_id: uuid.UUID):
         """Delete a medical record"""
         conn = self.pg.get_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # First get the record to delete from Pinecone
-            cur.execute("""
-                SELECT patient_id, vector_id
-                FROM medical_records
-                WHERE record_id = %s AND NOT is_deleted
-            """, (record_id,))
-            record = cur.fetchone()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # First get the record to delete from Pinecone
+                cur.execute("""
+                    SELECT patient_id, vector_id, condition, treatment
+                    FROM medical_records
+                    WHERE record_id = %s AND NOT is_deleted
+                """, (record_id,))
+                record = cur.fetchone()
 
-            # Delete from Pinecone
-            if record:
                 # Delete from Pinecone
-                self.pine.delete_vector(record['patient_id'], record['vector_id'])
+                if record:
+                    digest = self._lock_digest(cur, record['patient_id'])
 
-                # Soft delete from Postgres
-                cur.execute("""
-                    UPDATE medical_records
-                    SET is_deleted = TRUE, updated_at = CURRENT_TIMESTAMP
-                    WHERE record_id = %s
-                """, (record_id,))
+                    # Delete from Pinecone
+                    self.pine.delete_vector(record['patient_id'], record['vector_id'])
+
+                    # Soft delete from Postgres
+                    cur.execute("""
+                        UPDATE medical_records
+                        SET is_deleted = TRUE, updated_at = CURRENT_TIMESTAMP
+                        WHERE record_id = %s
+                    """, (record_id,))
+
+                    _adjust_counts(digest['conditions'], record['condition'], -1)
+                    _adjust_counts(digest['treatments'], record['treatment'], -1)
+                    # Only refill the latest notes when the deleted note was among them
+                    if any(n['record_id'] == str(record_id) for n in digest['latest_notes']):
+                        digest['latest_notes'] = self._latest_digest_notes(cur, record['patient_id'])
+                    digest['note_count'] -= 1
+                    self._save_digest(cur, digest)
+
+                    conn.commit()
+                    return True
+        except Exception:
+            conn.rollback()
+            raise
 
-                conn.commit()
-                return True
-            
         return False
     
     def get_patient_history(self, patient_id):
-        """Get patient history"""
+        """Get a patient's full note history, newest first"""
+        # Unbounded: chat and /history read the chart digest instead. Kept as the
+        # baseline for utils/benchmark_patient_digest.py.
         conn = self.pg.get_connection()
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
@@ -101,6 +172,185 @@ class PatientService:
             records = cur.fetchall()
         return records
     
+    def get_patient_digest(self, patient_id):
+        """Get the materialized chart digest for a patient, building it on first use"""
+        conn = self.pg.get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT patient_id, conditions, treatments, latest_notes, note_count, version, updated_at
+                    FROM patient_digests
+                    WHERE patient_id = %s
+                """, (patient_id,))
+                digest = cur.fetchone()
+
+                # Seeding commits only this thread's own transaction
+                if not digest:
+                    digest = self._lock_digest(cur, patient_id)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return digest
+
+    def rebuild_patient_digest(self, patient_id):
+        """Recompute a patient's digest from their records, e.g. after bulk imports"""
+        conn = self.pg.get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                digest = self._lock_digest(cur, patient_id)
+                digest.update(self._compute_digest(cur, patient_id))
+                self._save_digest(cur, digest)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return digest
+
+    def format_patient_digest(self, digest) -> str:
+        """Format a chart digest as a compact prompt-ready string"""
+        def counts(values: dict) -> str:
+            ranked = sorted(values.items(), key=lambda item: item[1], reverse=True)
+            return ", ".join(f"{name} ({count})" for name, count in ranked) or "None recorded"
+
+        return (
+            f"Total notes: {digest['note_count']}\n"
+            f"Conditions: {counts(digest['conditions'])}\n"
+            f"Treatments: {counts(digest['treatments'])}\n"
+            f"Latest notes:\n"
+            f"{self.format_get_patient_history(digest['latest_notes'])}"
+        )
+
+    def _lock_digest(self, cur, patient_id):
+        """Lock a patient's digest row for update, creating it from their records if missing"""
+        select = """
+            SELECT patient_id, conditions, treatments, latest_notes, note_count, version, updated_at
+            FROM patient_digests
+            WHERE patient_id = %s
+            FOR UPDATE
+        """
+        cur.execute(select, (patient_id,))
+        digest = cur.fetchone()
+        if digest:
+            return digest
+
+        computed = self._compute_digest(cur, patient_id)
+        cur.execute("""
+            INSERT INTO patient_digests (patient_id, conditions, treatments, latest_notes, note_count, version)
+            VALUES (%s, %s, %s, %s, %s, 1)
+            ON CONFLICT (patient_id) DO NOTHING
+        """, (
+            patient_id,
+            Json(computed['conditions']),
+            Json(computed['treatments']),
+            Json(computed['latest_notes']),
+            computed['note_count'],
+        ))
+        cur.execute(select, (patient_id,))
+        return cur.fetchone()
+
+    def _compute_digest(self, cur, patient_id):
+        """Compute digest fields from scratch; only used to seed or repair a digest"""
+        cur.execute("""
+            SELECT condition, treatment, COUNT(*) AS n
+            FROM medical_records
+            WHERE patient_id = %s AND NOT is_deleted
+            GROUP BY condition, treatment
+        """, (patient_id,))
+        conditions, treatments, note_count = {}, {}, 0
+        for row in cur.fetchall():
+            _adjust_counts(conditions, row['condition'], row['n'])
+            _adjust_counts(treatments, row['treatment'], row['n'])
+            note_count += row['n']
+
+        return {
+            'conditions': conditions,
+            'treatments': treatments,
+            'latest_notes': self._latest_digest_notes(cur, patient_id),
+            'note_count': note_count,
+        }
+
+    def _latest_digest_notes(self, cur, patient_id):
+        """Fetch the newest live notes for the digest"""
+        cur.execute("""
+            SELECT record_id, note, created_by, created_at
+            FROM medical_records
+            WHERE patient_id = %s AND NOT is_deleted
+            ORDER BY created_at DESC
+            LIMIT %s
+        """, (patient_id, config.DIGEST_LATEST_NOTES))
+        return [_digest_note(row) for row in cur.fetchall()]
+
+    def _save_digest(self, cur, digest):
+        """Write back a modified digest and bump its version"""
+        cur.execute("""
+            UPDATE patient_digests
+            SET conditions = %s, treatments = %s, latest_notes = %s, note_count = %s,
+                version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE patient_id = %s
+            RETURNING version, updated_at
+        """, (
+            Json(digest['conditions']),
+            Json(digest['treatments']),
+            Json(digest['latest_notes']),
+            digest['note_count'],
+            digest['patient_id'],
+        ))
+        digest.update(cur.fetchone())
+
+    def find_similar_patients(
+            self,
+            query: str,
+            condition: str = None,
+            start_date=None,
+            end_date=None,
+            exclude_patient_id=None,
+            limit: int = 10,
+    ):
+        """Find patients whose notes are similar to the query, best note per patient"""
+        if not query or not query.strip():
+            raise ValueError("Search query cannot be empty.")
+        if not 1 <= limit <= MAX_COHORT_LIMIT:
+            raise ValueError(f"Cohort search limit must be between 1 and {MAX_COHORT_LIMIT}.")
+
+        metadata_filter = {}
+        if condition:
+            metadata_filter["condition"] = {"$eq": condition}
+        if start_date or end_date:
+            created_at = {}
+            if start_date:
+                created_at["$gte"] = datetime.combine(start_date, time.min).timestamp()
+            if end_date:
+                created_at["$lte"] = datetime.combine(end_date, time.max).timestamp()
+            metadata_filter["created_at"] = created_at
+        if exclude_patient_id is not None:
+            metadata_filter["patient_id"] = {"$ne": int(exclude_patient_id)}
+
+        # Over-fetch so patients with many similar notes don't crowd out the rest
+        results = self.pine.query_cohort(
+            query, top_k=limit * config.COHORT_OVERFETCH, metadata_filter=metadata_filter
+        )
+
+        # Matches arrive best-first, so the first hit per patient is their best note
+        patients = {}
+        for match in results.matches:
+            patient_id = int(match.metadata["patient_id"])
+            if patient_id in patients:
+                continue
+            patients[patient_id] = {
+                "patient_id": patient_id,
+                "record_id": match.metadata.get("record_id"),
+                "vector_id": match.id,
+                "note": match.metadata.get("note", ""),
+                "condition": match.metadata.get("condition"),
+                "created_at": datetime.fromtimestamp(match.metadata["created_at"]),
+                "score": match.score,
+            }
+            if len(patients) == limit:
+                break
+
+        return list(patients.values())
+
     def format_get_patient_history(self, history: list):
         records = []
         for x in history:
@@ -111,4 +361,76 @@ class PatientService:
             )
             records.append(text)
         record_str = "\n---\n".join(records)
-        return record_str
\ No newline at end of file
+        return record_str
+
+    def search_medical_records(self, patient_id, query: str, mode: str = "keyword", limit: int = 10):
+        """Search a patient's notes by keyword, by embedding, or both fused with RRF"""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Invalid search mode '{mode}', expected one of {SEARCH_MODES}")
+        if not query or not query.strip():
+            raise ValueError("Search query cannot be empty.")
+        if limit < 1:
+            raise ValueError("Search limit must be at least 1.")
+
+        if mode == "keyword":
+            return self._keyword_search(patient_id, query, limit)
+        if mode == "semantic":
+            return self._semantic_search(patient_id, query, limit)
+
+        # Hybrid: reciprocal rank fusion over both candidate lists
+        candidates = max(limit, config.SEARCH_CANDIDATES)
+        fused = {}
+        for results in (
+            self._keyword_search(patient_id, query, candidates),
+            self._semantic_search(patient_id, query, candidates),
+        ):
+            for rank, record in enumerate(results, start=1):
+                entry = fused.setdefault(record['record_id'], {**record, 'score': 0.0})
+                entry['score'] += 1.0 / (config.SEARCH_RRF_K + rank)
+
+        ranked = sorted(fused.values(), key=lambda r: r['score'], reverse=True)
+        return ranked[:limit]
+
+    def _keyword_search(self, patient_id, query: str, limit: int):
+        """Full-text search over the GIN-indexed note tsvector; no embedding needed"""
+        conn = self.pg.get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT record_id, patient_id, note, vector_id, created_at, created_by,
+                           ts_rank_cd(note_tsv, q) AS score
+                    FROM medical_records, websearch_to_tsquery('english', %s) AS q
+                    WHERE patient_id = %s AND NOT is_deleted AND note_tsv @@ q
+                    ORDER BY score DESC, created_at DESC
+                    LIMIT %s
+                """, (query, patient_id, limit))
+                records = cur.fetchall()
+        except Exception:
+            # Don't leave the shared connection in an aborted transaction
+            conn.rollback()
+            raise
+        return records
+
+    def _semantic_search(self, patient_id, query: str, limit: int):
+        """Vector search in Pinecone, resolved back to live Postgres records"""
+        results = self.pine.query_vectors(patient_id, query, top_k=limit)
+        scores = {match.id: match.score for match in results.matches}
+        if not scores:
+            return []
+
+        conn = self.pg.get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT record_id, patient_id, note, vector_id, created_at, created_by
+                    FROM medical_records
+                    WHERE patient_id = %s AND NOT is_deleted AND vector_id = ANY(%s::uuid[])
+                """, (patient_id, list(scores)))
+                records = cur.fetchall()
+        except Exception:
+            conn.rollback()
+            raise
+
+        for record in records:
+            record['score'] = scores[str(record['vector_id'])]
+        return sorted(records, key=lambda r: r['score'], reverse=True)
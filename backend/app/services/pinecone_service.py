@@ -51,27 +51,41 @@ class PineconeService:
             self.logger.error(f"Failed to initialize Pinecone: {str(e)}")
             raise
     
-    def index_patient_data(self, patient_id, note: str):
-        """Index patient data in Pinecone"""
+    def index_patient_data(
+            self,
+            patient_id,
+            note: str,
+            vector_id: uuid.UUID,
+            created_at: datetime,
+            record_id=None,
+            condition: str = None,
+    ):
+        """Index patient data in Pinecone, timestamped with the record's creation time"""
         try:
             # Generate embedding
             embedding = self.embeddings.encode(note)
-            vector_id = uuid.uuid4()
 
             # Add metadata
             metadata = {
                 "note": note,
                 "patient_id": str(patient_id),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": created_at.isoformat()
             }
             
             # Upsert to Pinecone
             self.insert_vector(patient_id, vector_id, embedding, metadata)
+
+            # Mirror into the shared cohort namespace
+            self.insert_cohort_vectors([
+                (vector_id, embedding, self.cohort_metadata(patient_id, note, created_at, record_id, condition))
+            ])
             
             self.logger.info(f"Successfully indexed note for patient {patient_id}")
             return vector_id
         except Exception as e:
             self.logger.error(f"Error indexing patient data: {str(e)}")
+            # Don't leave a half-indexed note behind in either namespace
+            self.delete_vector(patient_id, vector_id)
             return None
 
     def insert_vector(self, patient_id, vector_id: uuid.UUID, vector, metadata=None):
@@ -86,14 +100,42 @@ class PineconeService:
             self.logger.error(f"Error inserting vector: {str(e)}")
             raise
 
+    def cohort_metadata(self, patient_id, note: str, created_at: datetime, record_id=None, condition: str = None):
+        """Build metadata for the cohort namespace; numeric fields allow range filters"""
+        metadata = {
+            "note": note,
+            "patient_id": int(patient_id),
+            "created_at": created_at.timestamp(),
+        }
+        if record_id:
+            metadata["record_id"] = str(record_id)
+        if condition:
+            metadata["condition"] = condition
+        return metadata
+
+    def insert_cohort_vectors(self, vectors):
+        """Insert (vector_id, vector, metadata) tuples into the cohort namespace"""
+        try:
+            self.index.upsert(
+                vectors=[(str(vector_id), vector, metadata) for vector_id, vector, metadata in vectors],
+                namespace=config.COHORT_NAMESPACE
+            )
+        except Exception as e:
+            self.logger.error(f"Error inserting cohort vectors: {str(e)}")
+            raise
+
     def delete_vector(self, patient_id, vector_id: uuid.UUID):
-        """Delete a vector from patient's namespace"""
+        """Delete a vector from patient's namespace and the cohort namespace"""
         namespace = f"patient_{patient_id}"
         try:
             self.index.delete(
                 ids=[str(vector_id)],  # Convert UUID to string
                 namespace=namespace
             )
+            self.index.delete(
+                ids=[str(vector_id)],
+                namespace=config.COHORT_NAMESPACE
+            )
             return True
         except Exception as e:
             self.logger.error(f"Error deleting vector: {str(e)}")
@@ -115,4 +157,21 @@ class PineconeService:
             return results
         except Exception as e:
             self.logger.error(f"Error querying vectors: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def query_cohort(self, query_text: str, top_k: int = 10, metadata_filter: dict = None):
+        """Query similar vectors across all patients in the cohort namespace"""
+        try:
+            query_vector = self.embeddings.encode(query_text)
+
+            results = self.index.query(
+                vector=query_vector,
+                top_k=top_k,
+                namespace=config.COHORT_NAMESPACE,
+                filter=metadata_filter or None,
+                include_metadata=True
+            )
+            return results
+        except Exception as e:
+            self.logger.error(f"Error querying cohort vectors: {str(e)}")
+            raise
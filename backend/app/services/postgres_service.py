@@ -1,6 +1,7 @@
 import psycopg2
 from config import config
 import logging
+import threading
 
 class PostgresService:
     def __init__(self):
@@ -11,8 +12,12 @@ class PostgresService:
 
     def _initialize_db(self) -> None:
         """Initialize Postgres connection"""
+        # Each thread (event loop, context workers) gets its own connection so
+        # transactions and row locks are never shared between threads
+        self._local = threading.local()
         try:
             self.conn = psycopg2.connect(config.DATABASE_URI)
+            self._local.conn = self.conn
             self.logger.info("Postgres connection initialized successfully")
         except Exception as e:
             self.logger.error(f"Failed to initialize Postgres connection: {str(e)}")
@@ -47,9 +52,51 @@ class PostgresService:
                     is_deleted BOOLEAN DEFAULT FALSE
                 )
             """)
+
+            # Condition tag used to filter cohort searches
+            cur.execute("""
+                ALTER TABLE medical_records
+                ADD COLUMN IF NOT EXISTS condition TEXT
+            """)
+            cur.execute("""
+                ALTER TABLE medical_records
+                ADD COLUMN IF NOT EXISTS treatment TEXT
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_medical_records_patient_created
+                ON medical_records (patient_id, created_at DESC)
+                WHERE NOT is_deleted
+            """)
+
+            # Full-text search over notes: generated tsvector + GIN index
+            cur.execute("""
+                ALTER TABLE medical_records
+                ADD COLUMN IF NOT EXISTS note_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', note)) STORED
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_medical_records_note_tsv
+                ON medical_records USING GIN (note_tsv)
+            """)
+
+            # Materialized per-patient chart digest, maintained on every write
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS patient_digests (
+                    patient_id INT PRIMARY KEY REFERENCES patients(patient_id),
+                    conditions JSONB NOT NULL DEFAULT '{}',
+                    treatments JSONB NOT NULL DEFAULT '{}',
+                    latest_notes JSONB NOT NULL DEFAULT '[]',
+                    note_count INT NOT NULL DEFAULT 0,
+                    version INT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
             self.conn.commit()
 
     def get_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(config.DATABASE_URL)
-        return self.conn
\ No newline at end of file
+        """Return the calling thread's connection, opening one if needed"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(config.DATABASE_URI)
+            self._local.conn = conn
+        return conn
\ No newline at end of file
@@ -0,0 +1,66 @@
+# Backfill the cohort namespace from existing medical records.
+# Run from backend/app: python -m utils.backfill_cohort_index [--batch-size N]
+import argparse
+import logging
+from psycopg2.extras import RealDictCursor
+from services.pinecone_service import PineconeService
+from services.postgres_service import PostgresService
+
+logger = logging.getLogger(__name__)
+
+
+def iter_batches(pg: PostgresService, batch_size: int):
+    """Yield live medical records in keyset-paginated batches"""
+    last_id = None
+    while True:
+        conn = pg.get_connection()
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT record_id, patient_id, note, vector_id, created_at, condition
+                FROM medical_records
+                WHERE NOT is_deleted AND (%s::uuid IS NULL OR record_id > %s::uuid)
+                ORDER BY record_id
+                LIMIT %s
+            """, (last_id, last_id, batch_size))
+            records = cur.fetchall()
+        if not records:
+            return
+        yield records
+        last_id = str(records[-1]["record_id"])
+
+
+def backfill(batch_size: int = 100) -> int:
+    """Embed every live record and upsert it into the cohort namespace"""
+    pg = PostgresService()
+    pine = PineconeService()
+
+    total = 0
+    for records in iter_batches(pg, batch_size):
+        embeddings = pine.embeddings.encode([r["note"] for r in records])
+        pine.insert_cohort_vectors([
+            (
+                r["vector_id"],
+                embedding,
+                pine.cohort_metadata(
+                    r["patient_id"], r["note"], r["created_at"], r["record_id"], r["condition"]
+                ),
+            )
+            for r, embedding in zip(records, embeddings)
+        ])
+        total += len(records)
+        logger.info(f"Backfilled {total} records into the cohort namespace")
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the cohort similarity index")
+    parser.add_argument("--batch-size", type=int, default=100, help="records per upsert batch")
+    args = parser.parse_args()
+
+    total = backfill(args.batch_size)
+    print(f"Backfilled {total} records")
+
+
+if __name__ == "__main__":
+    main()
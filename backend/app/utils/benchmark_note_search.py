@@ -0,0 +1,115 @@
+# Benchmark keyword, semantic and hybrid note search on the sample notes.
+# Run from backend/app: python -m utils.benchmark_note_search [--notes N]
+import argparse
+import csv
+import statistics
+import time
+from datetime import date
+from config import config
+from services.patient_service import PatientService
+
+DATA_PATH = "../data/patient_data.csv"
+
+# (query, terms whose presence in a note makes it relevant). Relevance is
+# judged on the note text itself, since many conditions share treatments.
+QUERIES = [
+    ("antibiotics", ["antibiotic"]),
+    ("dialysis", ["dialysis"]),
+    ("insulin", ["insulin"]),
+    ("chemotherapy", ["chemotherapy"]),
+    ("oxygen therapy", ["oxygen"]),
+    ("asthma triggers", ["asthma"]),
+    ("migraine triggers", ["migraine"]),
+    ("blood pressure", ["blood pressure", "antihypertensive"]),
+    ("deep brain stimulation", ["deep brain stimulation"]),
+    ("stroke recurrence", ["stroke"]),
+    # Paraphrases with little lexical overlap, where embeddings should help
+    ("kidney failure treatment", ["dialysis", "kidney"]),
+    ("trouble breathing", ["oxygen", "bronchodilator", "inhaler", "asthma"]),
+]
+
+
+def load_notes(limit: int):
+    """Load the sample doctor's notes from the CSV"""
+    with open(DATA_PATH, newline="") as f:
+        rows = list(csv.DictReader(f))[:limit]
+    return [row["Doctor's Notes"] for row in rows]
+
+
+def ingest(service: PatientService, patient_id, notes):
+    """Add every sample note to the benchmark patient"""
+    texts = {}
+    for note in notes:
+        record = service.add_medical_record(patient_id, note, provider_id=0)
+        texts[record["record_id"]] = note.lower()
+    return texts
+
+
+def cleanup(service: PatientService, patient_id):
+    """Remove the benchmark patient's vectors and rows from Pinecone and Postgres"""
+    conn = service.pg.get_connection()
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute("SELECT vector_id FROM medical_records WHERE patient_id = %s", (patient_id,))
+        vector_ids = [str(row[0]) for row in cur.fetchall()]
+
+    try:
+        service.pine.index.delete(delete_all=True, namespace=f"patient_{patient_id}")
+        for i in range(0, len(vector_ids), 1000):
+            service.pine.index.delete(ids=vector_ids[i:i + 1000], namespace=config.COHORT_NAMESPACE)
+    except Exception as e:
+        print(f"Failed to delete benchmark vectors: {str(e)}")
+
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM patient_digests WHERE patient_id = %s", (patient_id,))
+        cur.execute("DELETE FROM medical_records WHERE patient_id = %s", (patient_id,))
+        cur.execute("DELETE FROM patients WHERE patient_id = %s", (patient_id,))
+        conn.commit()
+
+
+def run(service: PatientService, patient_id, texts, mode: str, k: int, repeats: int):
+    """Return latency percentiles and mean precision@k for one search mode"""
+    latencies, precisions = [], []
+    for query, terms in QUERIES:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results = service.search_medical_records(patient_id, query, mode=mode, limit=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        relevant = {rid for rid, text in texts.items() if any(t in text for t in terms)}
+        hits = sum(1 for r in results if r["record_id"] in relevant)
+        # Don't penalise queries with fewer than k relevant notes
+        precisions.append(hits / min(k, len(relevant)) if relevant else 0.0)
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "precision_at_k": statistics.mean(precisions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark note search modes")
+    parser.add_argument("--notes", type=int, default=1000, help="number of sample notes to ingest")
+    parser.add_argument("--k", type=int, default=10, help="results per query")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per query")
+    args = parser.parse_args()
+
+    service = PatientService()
+    patient = service.create_patient("Benchmark Patient", date(1970, 1, 1), "Other")
+    patient_id = patient["patient_id"]
+    try:
+        texts = ingest(service, patient_id, load_notes(args.notes))
+        print(f"Ingested {len(texts)} notes for patient {patient_id}")
+
+        print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'P@' + str(args.k):>10}")
+        for mode in ("keyword", "semantic", "hybrid"):
+            stats = run(service, patient_id, texts, mode, args.k, args.repeats)
+            print(f"{mode:<10}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['precision_at_k']:>10.2f}")
+    finally:
+        cleanup(service, patient_id)
+
+
+if __name__ == "__main__":
+    main()
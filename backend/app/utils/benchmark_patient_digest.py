@@ -0,0 +1,98 @@
+# Benchmark history reads: full recompute vs the materialized chart digest.
+# Run from backend/app: python -m utils.benchmark_patient_digest [--sizes 10 1000 10000]
+import argparse
+import csv
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from itertools import cycle, islice
+from psycopg2.extras import execute_values
+from services.patient_service import PatientService
+
+DATA_PATH = "../data/patient_data.csv"
+
+
+def load_rows():
+    """Load (note, condition, treatment) tuples from the sample CSV"""
+    with open(DATA_PATH, newline="") as f:
+        return [
+            (row["Doctor's Notes"], row["Medical Condition"], row["Treatments"])
+            for row in csv.DictReader(f)
+        ]
+
+
+def seed_patient(service: PatientService, patient_id, rows, size: int):
+    """Give a patient `size` notes, bulk-inserted directly into Postgres"""
+    start = datetime.now() - timedelta(minutes=size)
+
+    conn = service.pg.get_connection()
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO medical_records (patient_id, note, vector_id, created_by, created_at, condition, treatment)
+            VALUES %s
+        """, [
+            (patient_id, note, uuid.uuid4(), 0, start + timedelta(minutes=i), condition, treatment)
+            for i, (note, condition, treatment) in enumerate(islice(cycle(rows), size))
+        ])
+        conn.commit()
+
+    # Records bypassed add_medical_record, so seed the digest once
+    service.rebuild_patient_digest(patient_id)
+
+
+def cleanup(service: PatientService, patient_ids):
+    """Remove the benchmark patients' digests, records and rows (none were indexed in Pinecone)"""
+    conn = service.pg.get_connection()
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM patient_digests WHERE patient_id = ANY(%s)", (patient_ids,))
+        cur.execute("DELETE FROM medical_records WHERE patient_id = ANY(%s)", (patient_ids,))
+        cur.execute("DELETE FROM patients WHERE patient_id = ANY(%s)", (patient_ids,))
+        conn.commit()
+
+
+def time_reads(read, repeats: int):
+    """Return median latency in ms and the size of the produced prompt text"""
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        text = read()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chart digest reads")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="notes per patient")
+    parser.add_argument("--repeats", type=int, default=20, help="timed reads per size")
+    args = parser.parse_args()
+
+    service = PatientService()
+    rows = load_rows()
+
+    patient_ids = []
+    try:
+        print(f"{'notes':>8}{'full ms':>10}{'full chars':>12}{'digest ms':>11}{'digest chars':>14}")
+        for size in args.sizes:
+            patient = service.create_patient(f"Digest Benchmark {size}", date(1970, 1, 1), "Other")
+            patient_id = patient["patient_id"]
+            patient_ids.append(patient_id)
+            seed_patient(service, patient_id, rows, size)
+
+            full_ms, full_chars = time_reads(
+                lambda: service.format_get_patient_history(service.get_patient_history(patient_id)),
+                args.repeats,
+            )
+            digest_ms, digest_chars = time_reads(
+                lambda: service.format_patient_digest(service.get_patient_digest(patient_id)),
+                args.repeats,
+            )
+            print(f"{size:>8}{full_ms:>10.2f}{full_chars:>12}{digest_ms:>11.2f}{digest_chars:>14}")
+    finally:
+        if patient_ids:
+            cleanup(service, patient_ids)
+
+
+if __name__ == "__main__":
+    main()
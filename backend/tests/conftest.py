@@ -0,0 +1,5 @@
+import os
+import sys
+
+# App modules import each other as top-level packages (e.g. `from config import config`)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from services.fake_llm import FakeLLM, FakeLLMError
+from services.llm_gateway import (
+    LLMGateway,
+    LLMOverloadedError,
+    LLMTimeoutError,
+    LLMUnavailableError,
+)
+
+
+def gateway(llm, **kwargs):
+    options = dict(
+        max_concurrency=1,
+        max_queue_size=1,
+        request_timeout=2.0,
+        max_retries=2,
+        retry_base_delay=0.001,
+        retry_max_delay=0.01,
+        retry_after=7,
+    )
+    options.update(kwargs)
+    return LLMGateway(llm, **options)
+
+
+def run_all(*coros):
+    async def gather():
+        return await asyncio.gather(*coros, return_exceptions=True)
+    return asyncio.run(gather())
+
+
+def test_sheds_load_when_queue_is_full():
+    g = gateway(FakeLLM(latency=0.1))
+
+    results = run_all(*(g.ainvoke("hi") for _ in range(3)))
+
+    rejected = [r for r in results if isinstance(r, LLMOverloadedError)]
+    assert len(rejected) == 1
+    assert rejected[0].retry_after == 7
+    assert sum(1 for r in results if not isinstance(r, Exception)) == 2
+    stats = g.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["max_wait_seconds"] > 0
+
+
+def test_times_out_waiting_for_a_slot():
+    g = gateway(FakeLLM(latency=0.3))
+
+    first, second = run_all(g.ainvoke("hi"), g.ainvoke("hi", timeout=0.05))
+
+    assert first.content == FakeLLM().response
+    assert isinstance(second, LLMTimeoutError)
+    assert g.stats()["queue_depth"] == 0
+
+
+def test_times_out_slow_call():
+    g = gateway(FakeLLM(latency=0.3))
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(g.ainvoke("hi", timeout=0.05))
+    assert g.stats()["in_flight"] == 0
+
+
+def test_retries_then_reports_unavailable():
+    llm = FakeLLM(latency=0, error_rate=1.0, error_status=503)
+    g = gateway(llm)
+
+    with pytest.raises(LLMUnavailableError) as exc:
+        asyncio.run(g.ainvoke("hi"))
+
+    assert exc.value.status_code == 503
+    assert exc.value.retry_after == 7
+    assert llm.calls == 3
+    assert g.stats()["retries"] == 2
+
+
+def test_unavailable_when_backoff_would_pass_deadline():
+    llm = FakeLLM(latency=0, error_rate=1.0, error_status=429)
+    g = gateway(llm, retry_base_delay=10, retry_max_delay=10)
+
+    with pytest.raises(LLMUnavailableError) as exc:
+        asyncio.run(g.ainvoke("hi", timeout=0.01))
+
+    assert exc.value.status_code == 429
+
+
+def test_uses_upstream_retry_after():
+    class Response:
+        status_code = 429
+        headers = {"retry-after": "12"}
+
+    class RateLimitedLLM:
+        async def ainvoke(self, prompt):
+            error = Exception("rate limited")
+            error.response = Response()
+            raise error
+
+    with pytest.raises(LLMUnavailableError) as exc:
+        asyncio.run(gateway(RateLimitedLLM()).ainvoke("hi"))
+
+    assert exc.value.retry_after == 12
+
+
+def test_does_not_retry_client_errors():
+    llm = FakeLLM(latency=0, error_rate=1.0, error_status=400)
+
+    with pytest.raises(FakeLLMError):
+        asyncio.run(gateway(llm).ainvoke("hi"))
+
+    assert llm.calls == 1